@@ -4,10 +4,14 @@ Tracks activity, consumption, and language learning habits with Google Sheets in
 Includes automatic weekly feedback via DeepSeek AI
 """
 
+import asyncio
 import os
 import json
-import re
+import random
+from itertools import islice
+from concurrent.futures import ThreadPoolExecutor
 from datetime import datetime, timedelta, time
+from time import monotonic, sleep
 from zoneinfo import ZoneInfo
 import logging
 
@@ -15,7 +19,7 @@ from telegram import Update
 from telegram.ext import Application, CommandHandler, MessageHandler, filters, ContextTypes, JobQueue
 import gspread
 from google.oauth2.service_account import Credentials
-import requests
+import httpx
 
 # Configure logging
 logging.basicConfig(
@@ -27,6 +31,53 @@ logger = logging.getLogger(__name__)
 # Constants
 MOSCOW_TZ = ZoneInfo("Europe/Moscow")
 
+# The marker written to habit cells. Kept as an escape so the stored value and
+# the equality checks against it can't be corrupted by a bad editor encoding
+# (a latin-1 round trip turns the literal into mojibake like 'âœ“').
+CHECK_MARK = "\u2713"  # ✓
+
+# How long cached sheet snapshots stay valid (seconds)
+SHEET_CACHE_TTL = 60
+
+# Transient Sheets API statuses worth retrying, and how many times
+_RETRYABLE_STATUSES = {429, 500, 503}
+_MAX_API_RETRIES = 5
+
+# Activity habit number -> sheet column: 1->C(3), 2->D(4), 3->E(5), 4->F(6), 5->G(7)
+_ACTIVITY_COL_MAP = {1: 3, 2: 4, 3: 5, 4: 6, 5: 7}
+
+# Message text -> habit number, so dispatch is one dict hit instead of
+# isdigit/int/range checks per message
+_HABIT_KEYS = {str(habit_id): habit_id for habit_id in _ACTIVITY_COL_MAP}
+
+# Consumption type -> (count column, cost column) in the Consumption sheet
+_CONSUMPTION_COLS = {'x': (4, 5), 'y': (6, 7), 'z': (8, 9)}
+
+# Column number -> A1 letter; the sheets never grow past column J, so this
+# avoids calling rowcol_to_a1 on every record
+_COL_LETTERS = [None, 'A', 'B', 'C', 'D', 'E', 'F', 'G', 'H', 'I', 'J']
+
+# Columns actually used per sheet, so cache refreshes don't download the
+# phantom columns left by the 15-column resize
+_SHEET_DATA_RANGES = {
+    "Activity": "A:I",
+    "Consumption": "A:I",
+    "Language": "A:F",
+}
+
+def _format_date(d):
+    """Format a date as YYYY-MM-DD; ~3x faster than locale-aware strftime"""
+    return f"{d.year:04d}-{d.month:02d}-{d.day:02d}"
+
+
+def _safe_int(s, default=0):
+    """Parse an int in one pass, returning default for empty/non-numeric input"""
+    try:
+        return int(s)
+    except (TypeError, ValueError):
+        return default
+
+
 # Sheet 1: Sambo Activity Habits
 HABITS = {
     1: "Prayer with first water",
@@ -36,8 +87,8 @@ HABITS = {
     5: "Strengthening and stretching session"
 }
 
-DAILY_HABITS = {1, 2, 3}
-WEEKLY_HABITS = {4, 5}
+DAILY_HABITS = frozenset({1, 2, 3})
+WEEKLY_HABITS = frozenset({4, 5})
 
 # Sheet 2: Consumption Habits
 CONSUMPTION_HABITS = {
@@ -53,6 +104,42 @@ LANGUAGE_HABITS = {
     'ta': "Tatar cards"
 }
 
+# Static body of the DeepSeek coaching prompt; only the weekly numbers
+# change, so the ~600-char string is built once instead of per call
+_FEEDBACK_PROMPT_TEMPLATE = """
+You are a supportive fitness and habit tracking coach. Analyze the following weekly performance data and provide encouraging, constructive feedback.
+
+CURRENT WEEK ({week}) PERFORMANCE:
+- Prayer with first water: {prayer} times
+- Qi Gong routine: {qigong} times
+- Freestyling on the ball: {ball} times
+- 20 minute run and stretch: {run} times
+- Strengthening and stretching: {strength} times
+- Days tracked: {days_tracked}/6
+
+CONSUMPTION THIS WEEK:
+- Coffee: {coffee_count} doses ({coffee_cost} руб)
+- Sugary food: {sugary_count} doses ({sugary_cost} руб)
+- Flour-based food: {flour_count} doses ({flour_cost} руб)
+
+LANGUAGE LEARNING THIS WEEK:
+- Chinese activation: {chinese} sessions
+- Hebrew cards: {hebrew} sessions
+- Tatar cards: {tatar} sessions
+
+PREVIOUS WEEKS COMPARISON:
+{previous}
+
+Please provide:
+1. A brief summary of this week's performance (2-3 sentences)
+2. Positive highlights (what went well)
+3. Areas for improvement
+4. One specific, actionable goal for next week
+5. Encouragement and motivation
+
+Keep the tone supportive and constructive. Use Russian if appropriate.
+"""
+
 class SamboBot:
     def __init__(self):
         self.bot_token = os.getenv("TELEGRAM_BOT_TOKEN")
@@ -65,8 +152,49 @@ class SamboBot:
         self.activity_sheet = None
         self.consumption_sheet = None
         self.language_sheet = None
+
+        # In-memory sheet cache: worksheet title -> (rows, fetched_at).
+        # Kept write-through by the _record_* methods so cache hits skip the
+        # full-sheet download entirely.
+        self._sheet_cache = {}
+        # Row index per worksheet: (user_id, date) -> row number, so row lookup
+        # is a dict hit instead of a linear scan
+        self._row_index = {}
+        # Rows grouped per worksheet by (user_id, week_number) -> [row numbers],
+        # so the weekly summaries only touch that user's rows for that week
+        self._week_index = {}
+        # Activity rows grouped by user_id -> [row numbers], so the stats
+        # scans never walk other users' history
+        self._user_index = {}
+
+        # Worksheets whose minimum size has already been verified, so repeat
+        # _trim_sheet calls in one process are free
+        self._trimmed = set()
+
+        # (year, month, day) -> week number string; one entry per date ever
+        # seen, so it stays tiny while making _get_week_number a dict hit
+        self._week_number_cache = {}
+
+        # Sheets calls are blocking HTTP; run them here so they don't stall
+        # the asyncio event loop while a message is being recorded. A single
+        # worker serializes all Sheets work, so a snapshot rebuild can never
+        # interleave with a record write and the cache/index structures are
+        # only ever touched by one thread
+        self._executor = ThreadPoolExecutor(max_workers=1)
+
+        # Shared async client for DeepSeek calls: non-blocking on the event
+        # loop, reuses the TLS connection, and carries the auth headers so
+        # they aren't rebuilt per request
+        headers = {}
+        if self.deepseek_api_key:
+            headers = {
+                "Authorization": f"Bearer {self.deepseek_api_key}",
+                "Content-Type": "application/json"
+            }
+        self._http = httpx.AsyncClient(timeout=30, headers=headers)
+
         self._init_google_sheets()
-        
+
     def _init_google_sheets(self):
         """Initialize Google Sheets client with service account credentials"""
         try:
@@ -90,53 +218,236 @@ class SamboBot:
             # Open the main spreadsheet
             spreadsheet = self.gs_client.open_by_key(self.sheet_id)
             
-            # Get or create the three sheets
-            try:
-                self.activity_sheet = spreadsheet.worksheet("Activity")
-            except gspread.WorksheetNotFound:
+            # Get or create the three sheets from one metadata fetch instead of
+            # a separate lookup round trip per worksheet
+            worksheets = {ws.title: ws for ws in spreadsheet.worksheets()}
+
+            self.activity_sheet = worksheets.get("Activity")
+            if self.activity_sheet is None:
                 self.activity_sheet = spreadsheet.add_worksheet(title="Activity", rows=100, cols=10)
                 logger.info("Created Activity sheet")
-            
-            try:
-                self.consumption_sheet = spreadsheet.worksheet("Consumption")
-            except gspread.WorksheetNotFound:
+
+            self.consumption_sheet = worksheets.get("Consumption")
+            if self.consumption_sheet is None:
                 self.consumption_sheet = spreadsheet.add_worksheet(title="Consumption", rows=100, cols=10)
                 logger.info("Created Consumption sheet")
-            
-            try:
-                self.language_sheet = spreadsheet.worksheet("Language")
-            except gspread.WorksheetNotFound:
+
+            self.language_sheet = worksheets.get("Language")
+            if self.language_sheet is None:
                 self.language_sheet = spreadsheet.add_worksheet(title="Language", rows=100, cols=10)
                 logger.info("Created Language sheet")
             
-            # Initialize sheet structures
-            self._ensure_activity_sheet_structure()
-            self._ensure_consumption_sheet_structure()
-            self._ensure_language_sheet_structure()
-            
+            # Initialize sheet structures (one batched header read for all sheets)
+            self._ensure_sheet_structures(spreadsheet)
+
+            # Prewarm the caches and row indexes so the first message after
+            # startup gets O(1) row lookups instead of a full-sheet scan
+            self._rebuild_indexes()
+
             logger.info("Google Sheets initialized successfully")
-        except Exception as e:
-            logger.error(f"Failed to initialize Google Sheets: {e}")
-            import traceback
-            logger.error(traceback.format_exc())
+        except Exception:
+            logger.exception("Failed to initialize Google Sheets")
 
     def _trim_sheet(self, worksheet):
         """Remove empty rows and columns beyond actual data to prevent phantom cells"""
+        if worksheet.title in self._trimmed:
+            return
         try:
-            # Just ensure minimum size, don't trim down
+            # Just ensure minimum size, don't trim down. row_count/col_count
+            # come from the worksheet properties already in memory, so the
+            # common already-sized case issues no API call at all.
             current_rows = worksheet.row_count
             current_cols = worksheet.col_count
-            
+
             min_rows = 200
             min_cols = 15
-            
+
             if current_rows < min_rows or current_cols < min_cols:
                 worksheet.resize(rows=max(current_rows, min_rows), cols=max(current_cols, min_cols))
                 logger.info(f"Resized sheet {worksheet.title} to {max(current_rows, min_rows)}x{max(current_cols, min_cols)}")
-                
+
+            self._trimmed.add(worksheet.title)
+
         except Exception as e:
             logger.error(f"Failed to resize sheet: {e}")
 
+    def _with_retry(self, fn, *args, **kwargs):
+        """Call a gspread function, retrying rate-limit and server errors
+
+        Google returns 429 near the 100 req/100s quota; backing off and
+        retrying absorbs those bursts instead of surfacing an error to the
+        user. Non-retryable errors propagate unchanged.
+        """
+        for attempt in range(_MAX_API_RETRIES):
+            try:
+                return fn(*args, **kwargs)
+            except gspread.exceptions.APIError as e:
+                response = getattr(e, "response", None)
+                status = response.status_code if response is not None else None
+                if status not in _RETRYABLE_STATUSES or attempt == _MAX_API_RETRIES - 1:
+                    raise
+                delay = min(60, 2 ** attempt + random.random())
+                logger.warning(
+                    f"Sheets API returned {status}, retrying in {delay:.1f}s "
+                    f"(attempt {attempt + 1}/{_MAX_API_RETRIES})"
+                )
+                sleep(delay)
+
+    def _ensure_sheet_structures(self, spreadsheet):
+        """Ensure all three sheets have proper structure with one batched header read"""
+        expected = [
+            (self.activity_sheet, [
+                "User ID", "Date", "Prayer", "Qi Gong", "Ball", "Run/Stretch",
+                "Strength/Stretch", "Week Number", "Goals"
+            ]),
+            (self.consumption_sheet, [
+                "User ID", "Date", "Week Number", "Coffee (x)", "Coffee Cost",
+                "Sugary (y)", "Sugary Cost", "Flour (z)", "Flour Cost"
+            ]),
+            (self.language_sheet, [
+                "User ID", "Date", "Week Number", "Chinese (ch)", "Hebrew (he)", "Tatar (ta)"
+            ]),
+        ]
+        expected = [(ws, headers) for ws, headers in expected if ws is not None]
+        if not expected:
+            return
+
+        try:
+            resp = self._with_retry(
+                spreadsheet.values_batch_get,
+                ranges=[f"'{ws.title}'!1:1" for ws, _ in expected]
+            )
+            value_ranges = resp.get("valueRanges", [])
+        except Exception as e:
+            logger.error(f"Failed to batch-read sheet headers: {e}")
+            return
+
+        for (worksheet, headers), value_range in zip(expected, value_ranges):
+            try:
+                values = value_range.get("values", [])
+                current = values[0] if values else []
+                if current != headers:
+                    worksheet.clear()
+                    worksheet.append_row(headers)
+                    logger.info(f"{worksheet.title} sheet structure initialized")
+                self._trim_sheet(worksheet)
+            except Exception as e:
+                logger.error(f"Failed to ensure {worksheet.title} sheet structure: {e}")
+
+    def _rebuild_indexes(self):
+        """Populate the sheet caches and (user_id, date) row indexes in one pass each"""
+        worksheets = [
+            ws for ws in (self.activity_sheet, self.consumption_sheet, self.language_sheet)
+            if ws is not None
+        ]
+        if not worksheets:
+            return
+
+        spreadsheet = worksheets[0].spreadsheet
+
+        # Fetch all three sheets in one values_batch_get instead of a round
+        # trip per worksheet
+        try:
+            resp = self._with_retry(
+                spreadsheet.values_batch_get,
+                ranges=[
+                    f"'{ws.title}'!{_SHEET_DATA_RANGES.get(ws.title, 'A:Z')}"
+                    for ws in worksheets
+                ]
+            )
+            for worksheet, value_range in zip(worksheets, resp.get("valueRanges", [])):
+                self._store_snapshot(worksheet, value_range.get("values", []))
+            return
+        except Exception as e:
+            logger.error(f"Failed to batch-load sheet snapshots: {e}")
+
+        # Fall back to per-worksheet fetches
+        for worksheet in worksheets:
+            try:
+                self._cached_get_all_values(worksheet, ttl=0)
+            except Exception as e:
+                logger.error(f"Failed to build row index for {worksheet.title}: {e}")
+
+    def _store_snapshot(self, worksheet, rows):
+        """Cache a sheet snapshot and rebuild the indexes derived from it"""
+        self._sheet_cache[worksheet.title] = (rows, monotonic())
+        self._row_index[worksheet.title] = {
+            (row[0], row[1]): row_idx
+            for row_idx, row in enumerate(islice(rows, 1, None), start=2)
+            if len(row) > 1
+        }
+        if worksheet in (self.consumption_sheet, self.language_sheet):
+            week_index = {}
+            for row_idx, row in enumerate(islice(rows, 1, None), start=2):
+                if len(row) > 2:
+                    week_index.setdefault((row[0], row[2]), []).append(row_idx)
+            self._week_index[worksheet.title] = week_index
+        elif worksheet is self.activity_sheet:
+            user_index = {}
+            for row_idx, row in enumerate(islice(rows, 1, None), start=2):
+                if row:
+                    user_index.setdefault(row[0], []).append(row_idx)
+            self._user_index[worksheet.title] = user_index
+
+    def _cached_get_all_values(self, worksheet, ttl=SHEET_CACHE_TTL):
+        """Get all worksheet values, served from the in-memory cache when fresh"""
+        cached = self._sheet_cache.get(worksheet.title)
+        if cached is not None:
+            rows, fetched_at = cached
+            if monotonic() - fetched_at < ttl:
+                return rows
+
+        data_range = _SHEET_DATA_RANGES.get(worksheet.title)
+        if data_range is not None:
+            rows = self._with_retry(worksheet.get_values, data_range)
+        else:
+            rows = self._with_retry(worksheet.get_all_values)
+        self._store_snapshot(worksheet, rows)
+        return rows
+
+    def _append_row_indexed(self, worksheet, new_row):
+        """Append a row and return its actual row number from the API response
+
+        The values.append response reports the updated range, so the row number
+        is authoritative even under concurrent appends - no guessing from the
+        cached row count.
+        """
+        resp = self._with_retry(
+            worksheet.append_row, new_row, value_input_option="RAW", table_range="A1"
+        )
+        a1_range = resp["updates"]["updatedRange"].split("!", 1)[1]
+        row_num = gspread.utils.a1_range_to_grid_range(a1_range)["startRowIndex"] + 1
+        self._cache_append_row(worksheet, new_row, row_num)
+        return row_num
+
+    def _cache_append_row(self, worksheet, new_row, row_num):
+        """Write-through: reflect an appended row in the cache and row index"""
+        cached = self._sheet_cache.get(worksheet.title)
+        if cached is not None:
+            if row_num == len(cached[0]) + 1:
+                cached[0].append(new_row)
+            else:
+                # Another writer appended rows we haven't seen - snapshot is stale
+                del self._sheet_cache[worksheet.title]
+        if len(new_row) > 1:
+            self._row_index.setdefault(worksheet.title, {})[(new_row[0], new_row[1])] = row_num
+        if worksheet in (self.consumption_sheet, self.language_sheet) and len(new_row) > 2:
+            self._week_index.setdefault(worksheet.title, {}).setdefault(
+                (new_row[0], new_row[2]), []).append(row_num)
+        elif worksheet is self.activity_sheet and new_row:
+            self._user_index.setdefault(worksheet.title, {}).setdefault(
+                new_row[0], []).append(row_num)
+
+    def _cache_set_cell(self, worksheet, row_num, col, value):
+        """Write-through: reflect a single-cell update in the cached rows"""
+        cached = self._sheet_cache.get(worksheet.title)
+        if cached is None or row_num > len(cached[0]):
+            return
+        row = cached[0][row_num - 1]
+        while len(row) < col:
+            row.append("")
+        row[col - 1] = value
+
     def _get_moscow_now(self):
         """Get current time in Moscow timezone"""
         return datetime.now(MOSCOW_TZ)
@@ -154,176 +465,169 @@ class SamboBot:
         """Get week number for tracking"""
         if date is None:
             date = self._get_moscow_now()
-        week_start = self._get_week_start(date)
-        return week_start.strftime("%Y-%m-%d")
+        # Memoized per calendar date: within a day every call resolves to the
+        # same Monday, so skip the weekday/timedelta arithmetic after the first
+        key = (date.year, date.month, date.day)
+        week_number = self._week_number_cache.get(key)
+        if week_number is None:
+            week_number = _format_date(self._get_week_start(date))
+            self._week_number_cache[key] = week_number
+        return week_number
 
     # ========== SHEET 1: ACTIVITY HABITS ==========
     
-    def _ensure_activity_sheet_structure(self):
-        """Ensure Activity sheet has proper structure"""
-        try:
-            if not self.activity_sheet:
-                return
-            
-            headers = self.activity_sheet.row_values(1) if self.activity_sheet.row_count > 0 else []
-            expected_headers = [
-                "User ID", "Date", "Prayer", "Qi Gong", "Ball", "Run/Stretch", 
-                "Strength/Stretch", "Week Number", "Goals"
-            ]
-            
-            if headers != expected_headers:
-                self.activity_sheet.clear()
-                self.activity_sheet.append_row(expected_headers)
-                logger.info("Activity sheet structure initialized")
-                
-            self._trim_sheet(self.activity_sheet)
-        except Exception as e:
-            logger.error(f"Failed to ensure activity sheet structure: {e}")
+    def _get_activity_row(self, user_id, date=None, today_str=None, week_number=None, prefill=None):
+        """Get or create user's row for the day in Activity sheet
 
-    def _get_activity_row(self, user_id, date=None):
-        """Get or create user's row for the day in Activity sheet"""
+        prefill maps column number -> value; when a new row has to be created
+        those cells are written as part of the append itself, so the caller's
+        update is folded into the same API call. Returns (row_num, row_data,
+        created) where created tells the caller whether prefill already landed.
+        """
         try:
             if date is None:
                 date = self._get_moscow_now()
-            
-            today_str = date.strftime("%Y-%m-%d")
-            week_number = self._get_week_number(date)
-            
-            all_rows = self.activity_sheet.get_all_values()
+            if today_str is None:
+                today_str = _format_date(date)
+            if week_number is None:
+                week_number = self._get_week_number(date)
+
+            all_rows = self._cached_get_all_values(self.activity_sheet)
             logger.info(f"Activity sheet has {len(all_rows)} rows total")
-            
+
             # Look for existing row for this user and date
-            for row_idx, row in enumerate(all_rows[1:], start=2):
-                if len(row) > 1:
-                    if row[0] == str(user_id) and row[1] == today_str:
-                        logger.info(f"Found existing row {row_idx} for user {user_id} on {today_str}")
-                        return row_idx, row
-            
-            # Create new row for today
-            new_row = [str(user_id), today_str, "", "", "", "", "", week_number, ""]
-            self.activity_sheet.append_row(new_row)
-            new_row_num = len(all_rows) + 1
+            uid_str = str(user_id)
+            row_idx = self._row_index.get(self.activity_sheet.title, {}).get((uid_str, today_str))
+            if row_idx is not None:
+                logger.info(f"Found existing row {row_idx} for user {user_id} on {today_str}")
+                return row_idx, all_rows[row_idx - 1], False
+
+            # Create new row for today, with the caller's cells already filled
+            new_row = [uid_str, today_str, "", "", "", "", "", week_number, ""]
+            if prefill:
+                for col, value in prefill.items():
+                    new_row[col - 1] = value
+            new_row_num = self._append_row_indexed(self.activity_sheet, new_row)
             logger.info(f"Created new row {new_row_num} for user {user_id} on {today_str}")
-            return new_row_num, new_row
-        except Exception as e:
-            logger.error(f"Failed to get activity row: {e}")
-            import traceback
-            logger.error(traceback.format_exc())
-            return None, None
+            return new_row_num, new_row, True
+        except Exception:
+            logger.exception("Failed to get activity row")
+            return None, None, False
 
-    def _record_habit(self, user_id, habit_id):
+    def _record_habit(self, user_id, habit_id, now=None, today_str=None, week_number=None):
         """Record a completed habit in Activity sheet"""
         try:
             if not self.activity_sheet:
                 return False, "Activity sheet not initialized"
-            
+
             if habit_id not in HABITS:
                 return False, f"Invalid habit number. Use 1-5."
-            
-            row_num, row_data = self._get_activity_row(user_id)
-            
+
+            col = _ACTIVITY_COL_MAP[habit_id]
+
+            row_num, row_data, created = self._get_activity_row(
+                user_id, now, today_str, week_number, prefill={col: CHECK_MARK}
+            )
+
             if row_num is None:
                 return False, "Failed to record habit"
-            
-            # Column mapping: 1->C(3), 2->D(4), 3->E(5), 4->F(6), 5->G(7)
-            col_map = {1: 3, 2: 4, 3: 5, 4: 6, 5: 7}
-            col = col_map[habit_id]
-            
-            # Check if already recorded
-            current_value = self.activity_sheet.cell(row_num, col).value
-            
-            if current_value and current_value.strip():
-                return False, f"{HABITS[habit_id]} already recorded today"
-            
-            # Record the habit
-            self.activity_sheet.update_cell(row_num, col, "✓")
-            
+
+            if not created:
+                # Check if already recorded - row_data from _get_activity_row
+                # already holds the cell value, so no extra API read is needed
+                current_value = row_data[col - 1] if len(row_data) >= col else ""
+
+                if current_value and current_value.strip():
+                    return False, f"{HABITS[habit_id]} already recorded today"
+
+                # Record the habit in a single API call
+                self._with_retry(self.activity_sheet.batch_update, [{
+                    "range": f"{_COL_LETTERS[col]}{row_num}",
+                    "values": [[CHECK_MARK]]
+                }], value_input_option="RAW")
+                self._cache_set_cell(self.activity_sheet, row_num, col, CHECK_MARK)
+
             logger.info(f"Recorded habit {habit_id} for user {user_id}")
-            return True, f"✓ {HABITS[habit_id]} recorded!"
-        except Exception as e:
-            logger.error(f"Failed to record habit: {e}")
-            import traceback
-            logger.error(traceback.format_exc())
+            return True, f"{CHECK_MARK} {HABITS[habit_id]} recorded!"
+        except Exception:
+            logger.exception("Failed to record habit")
             return False, "Error recording habit"
 
     # ========== SHEET 2: CONSUMPTION HABITS ==========
     
-    def _ensure_consumption_sheet_structure(self):
-        """Ensure Consumption sheet has proper structure"""
-        try:
-            if not self.consumption_sheet:
-                return
-            
-            headers = self.consumption_sheet.row_values(1) if self.consumption_sheet.row_count > 0 else []
-            expected_headers = [
-                "User ID", "Date", "Week Number", "Coffee (x)", "Coffee Cost", 
-                "Sugary (y)", "Sugary Cost", "Flour (z)", "Flour Cost"
-            ]
-            
-            if headers != expected_headers:
-                self.consumption_sheet.clear()
-                self.consumption_sheet.append_row(expected_headers)
-                logger.info("Consumption sheet structure initialized")
-                
-            self._trim_sheet(self.consumption_sheet)
-        except Exception as e:
-            logger.error(f"Failed to ensure consumption sheet structure: {e}")
+    def _get_consumption_row(self, user_id, week_number, date=None, today_str=None, prefill=None):
+        """Get or create user's row for consumption tracking
 
-    def _get_consumption_row(self, user_id, week_number, date=None):
-        """Get or create user's row for consumption tracking"""
+        prefill maps column number -> value for new rows, folding the caller's
+        update into the append call (see _get_activity_row).
+        """
         try:
             if not self.consumption_sheet:
-                return None, None
-            
+                return None, None, False
+
             if date is None:
                 date = self._get_moscow_now()
-            
-            today_str = date.strftime("%Y-%m-%d")
-            all_rows = self.consumption_sheet.get_all_values()
+            if today_str is None:
+                today_str = _format_date(date)
+
+            all_rows = self._cached_get_all_values(self.consumption_sheet)
             logger.info(f"Consumption sheet has {len(all_rows)} rows total")
-            
-            for row_idx, row in enumerate(all_rows[1:], start=2):
-                if len(row) > 2:
-                    if row[0] == str(user_id) and row[1] == today_str and row[2] == week_number:
-                        logger.info(f"Found existing consumption row {row_idx}")
-                        return row_idx, row
-            
+
+            uid_str = str(user_id)
+            row_idx = self._row_index.get(self.consumption_sheet.title, {}).get((uid_str, today_str))
+            if row_idx is not None:
+                row = all_rows[row_idx - 1]
+                if len(row) > 2 and row[2] == week_number:
+                    logger.info(f"Found existing consumption row {row_idx}")
+                    return row_idx, row, False
+
             # Create new row
-            new_row = [str(user_id), today_str, week_number, "", "", "", "", "", ""]
-            self.consumption_sheet.append_row(new_row)
-            new_row_num = len(all_rows) + 1
+            new_row = [uid_str, today_str, week_number, "", "", "", "", "", ""]
+            if prefill:
+                for col, value in prefill.items():
+                    new_row[col - 1] = value
+            new_row_num = self._append_row_indexed(self.consumption_sheet, new_row)
             logger.info(f"Created new consumption row {new_row_num}")
-            return new_row_num, new_row
+            return new_row_num, new_row, True
         except Exception as e:
             logger.error(f"Failed to get consumption row: {e}")
-            return None, None
+            return None, None, False
 
     def _parse_consumption_input(self, text):
-        """Parse consumption input like 'xxx', 'xx 150', 'y 75', etc."""
+        """Parse consumption input like 'xxx', 'xx 150', 'y 75', etc.
+
+        Hand-rolled scan instead of a regex: the input is at most a few
+        characters and this runs on every message. Mixed letters like 'xy'
+        are rejected.
+        """
         text = text.strip().lower()
-        
-        match = re.match(r'^([xyz]+)(?:\s+(\d+))?$', text)
-        if not match:
+        if not text:
             return None
-        
-        letters = match.group(1)
-        cost = match.group(2)
-        
-        if 'x' in letters:
-            habit_type = 'x'
-        elif 'y' in letters:
-            habit_type = 'y'
-        elif 'z' in letters:
-            habit_type = 'z'
-        else:
+
+        habit_type = text[0]
+        if habit_type not in CONSUMPTION_HABITS:
             return None
-        
-        count = letters.count(habit_type)
-        cost_int = int(cost) if cost else 0
-        
-        return habit_type, count, cost_int
 
-    def _record_consumption(self, user_id, text):
+        # Count the run of the same letter at the start
+        count = 1
+        n = len(text)
+        while count < n and text[count] == habit_type:
+            count += 1
+
+        rest = text[count:]
+        if not rest:
+            return habit_type, count, 0
+
+        # Anything after the letters must be whitespace followed by digits
+        if not rest[0].isspace():
+            return None
+        cost = rest.strip()
+        if not cost.isdecimal():
+            return None
+
+        return habit_type, count, int(cost)
+
+    def _record_consumption(self, user_id, text, now=None, today_str=None, week_number=None):
         """Record consumption in Consumption sheet"""
         try:
             if not self.consumption_sheet:
@@ -334,36 +638,55 @@ class SamboBot:
                 return False, "Invalid format. Use: 'x', 'xxx', 'xx 150', 'y 75', 'zzz 200'"
             
             habit_type, count, cost = result
-            
-            now = self._get_moscow_now()
-            week_number = self._get_week_number(now)
-            
-            row_num, row_data = self._get_consumption_row(user_id, week_number, now)
+
+            if now is None:
+                now = self._get_moscow_now()
+            if week_number is None:
+                week_number = self._get_week_number(now)
+
+            count_col, cost_col = _CONSUMPTION_COLS[habit_type]
+
+            prefill = {count_col: str(count)}
+            if cost > 0:
+                prefill[cost_col] = str(cost)
+
+            row_num, row_data, created = self._get_consumption_row(
+                user_id, week_number, now, today_str, prefill=prefill
+            )
             if row_num is None:
                 return False, "Failed to create consumption record"
-            
-            if habit_type == 'x':
-                count_col, cost_col = 4, 5
-            elif habit_type == 'y':
-                count_col, cost_col = 6, 7
+
+            if created:
+                # The append already wrote today's first values - nothing to add
+                new_count = count
+                new_cost = cost
             else:
-                count_col, cost_col = 8, 9
-            
-            current_count_str = self.consumption_sheet.cell(row_num, count_col).value or "0"
-            current_cost_str = self.consumption_sheet.cell(row_num, cost_col).value or "0"
-            
-            current_count = int(current_count_str) if current_count_str.isdigit() else 0
-            current_cost = int(current_cost_str) if current_cost_str.isdigit() else 0
-            
-            new_count = current_count + count
-            new_cost = current_cost + cost
-            
-            self.consumption_sheet.update_cell(row_num, count_col, str(new_count))
-            if cost > 0:
-                self.consumption_sheet.update_cell(row_num, cost_col, str(new_cost))
+                # Read current values from the row data we already have - no extra API reads
+                current_count = _safe_int(row_data[count_col - 1] if len(row_data) >= count_col else "")
+                current_cost = _safe_int(row_data[cost_col - 1] if len(row_data) >= cost_col else "")
+
+                new_count = current_count + count
+                new_cost = current_cost + cost
+
+                # Write count (and cost if given) in a single batched API call
+                updates = [{
+                    "range": f"{_COL_LETTERS[count_col]}{row_num}",
+                    "values": [[str(new_count)]]
+                }]
+                if cost > 0:
+                    updates.append({
+                        "range": f"{_COL_LETTERS[cost_col]}{row_num}",
+                        "values": [[str(new_cost)]]
+                    })
+                self._with_retry(
+                    self.consumption_sheet.batch_update, updates, value_input_option="RAW"
+                )
+                self._cache_set_cell(self.consumption_sheet, row_num, count_col, str(new_count))
+                if cost > 0:
+                    self._cache_set_cell(self.consumption_sheet, row_num, cost_col, str(new_cost))
             
             habit_name = CONSUMPTION_HABITS[habit_type]
-            response = f"✓ {habit_name}: +{count} dose(s)"
+            response = f"{CHECK_MARK} {habit_name}: +{count} dose(s)"
             if cost > 0:
                 response += f", +{cost} руб"
             response += f"\nToday's total: {new_count} dose(s)"
@@ -373,64 +696,51 @@ class SamboBot:
             logger.info(f"Recorded consumption: type={habit_type}, count={count}, cost={cost}")
             return True, response
             
-        except Exception as e:
-            logger.error(f"Failed to record consumption: {e}")
-            import traceback
-            logger.error(traceback.format_exc())
+        except Exception:
+            logger.exception("Failed to record consumption")
             return False, "Error recording consumption"
 
     # ========== SHEET 3: LANGUAGE LEARNING HABITS ==========
     
-    def _ensure_language_sheet_structure(self):
-        """Ensure Language sheet has proper structure"""
-        try:
-            if not self.language_sheet:
-                return
-            
-            headers = self.language_sheet.row_values(1) if self.language_sheet.row_count > 0 else []
-            expected_headers = [
-                "User ID", "Date", "Week Number", "Chinese (ch)", "Hebrew (he)", "Tatar (ta)"
-            ]
-            
-            if headers != expected_headers:
-                self.language_sheet.clear()
-                self.language_sheet.append_row(expected_headers)
-                logger.info("Language sheet structure initialized")
-                
-            self._trim_sheet(self.language_sheet)
-        except Exception as e:
-            logger.error(f"Failed to ensure language sheet structure: {e}")
+    def _get_language_row(self, user_id, week_number, date=None, today_str=None, prefill=None):
+        """Get or create user's row for language tracking
 
-    def _get_language_row(self, user_id, week_number, date=None):
-        """Get or create user's row for language tracking"""
+        prefill maps column number -> value for new rows, folding the caller's
+        update into the append call (see _get_activity_row).
+        """
         try:
             if not self.language_sheet:
-                return None, None
-            
+                return None, None, False
+
             if date is None:
                 date = self._get_moscow_now()
-            
-            today_str = date.strftime("%Y-%m-%d")
-            all_rows = self.language_sheet.get_all_values()
+            if today_str is None:
+                today_str = _format_date(date)
+
+            all_rows = self._cached_get_all_values(self.language_sheet)
             logger.info(f"Language sheet has {len(all_rows)} rows total")
-            
-            for row_idx, row in enumerate(all_rows[1:], start=2):
-                if len(row) > 2:
-                    if row[0] == str(user_id) and row[1] == today_str and row[2] == week_number:
-                        logger.info(f"Found existing language row {row_idx}")
-                        return row_idx, row
-            
+
+            uid_str = str(user_id)
+            row_idx = self._row_index.get(self.language_sheet.title, {}).get((uid_str, today_str))
+            if row_idx is not None:
+                row = all_rows[row_idx - 1]
+                if len(row) > 2 and row[2] == week_number:
+                    logger.info(f"Found existing language row {row_idx}")
+                    return row_idx, row, False
+
             # Create new row
-            new_row = [str(user_id), today_str, week_number, "", "", ""]
-            self.language_sheet.append_row(new_row)
-            new_row_num = len(all_rows) + 1
+            new_row = [uid_str, today_str, week_number, "", "", ""]
+            if prefill:
+                for col, value in prefill.items():
+                    new_row[col - 1] = value
+            new_row_num = self._append_row_indexed(self.language_sheet, new_row)
             logger.info(f"Created new language row {new_row_num}")
-            return new_row_num, new_row
+            return new_row_num, new_row, True
         except Exception as e:
             logger.error(f"Failed to get language row: {e}")
-            return None, None
+            return None, None, False
 
-    def _record_language(self, user_id, text):
+    def _record_language(self, user_id, text, now=None, today_str=None, week_number=None):
         """Record language learning activity"""
         try:
             if not self.language_sheet:
@@ -451,29 +761,36 @@ class SamboBot:
             else:
                 return False, "Invalid language code. Use: 'ch', 'he', or 'ta'"
             
-            now = self._get_moscow_now()
-            week_number = self._get_week_number(now)
-            
-            row_num, row_data = self._get_language_row(user_id, week_number, now)
+            if now is None:
+                now = self._get_moscow_now()
+            if week_number is None:
+                week_number = self._get_week_number(now)
+
+            row_num, row_data, created = self._get_language_row(
+                user_id, week_number, now, today_str, prefill={col: CHECK_MARK}
+            )
             if row_num is None:
                 return False, "Failed to create language record"
-            
-            # Check if already recorded today
-            current_value = self.language_sheet.cell(row_num, col).value
-            if current_value:
-                return False, f"{LANGUAGE_HABITS[lang_type]} already recorded today"
-            
-            # Record the activity
-            self.language_sheet.update_cell(row_num, col, "✓")
-            
+
+            if not created:
+                # Check if already recorded today using the row data we already have
+                current_value = row_data[col - 1] if len(row_data) >= col else ""
+                if current_value:
+                    return False, f"{LANGUAGE_HABITS[lang_type]} already recorded today"
+
+                # Record the activity in a single API call
+                self._with_retry(self.language_sheet.batch_update, [{
+                    "range": f"{_COL_LETTERS[col]}{row_num}",
+                    "values": [[CHECK_MARK]]
+                }], value_input_option="RAW")
+                self._cache_set_cell(self.language_sheet, row_num, col, CHECK_MARK)
+
             habit_name = LANGUAGE_HABITS[lang_type]
             logger.info(f"Recorded language activity: type={lang_type}")
-            return True, f"✓ {habit_name} recorded!"
+            return True, f"{CHECK_MARK} {habit_name} recorded!"
             
-        except Exception as e:
-            logger.error(f"Failed to record language activity: {e}")
-            import traceback
-            logger.error(traceback.format_exc())
+        except Exception:
+            logger.exception("Failed to record language activity")
             return False, "Error recording language activity"
 
     def _get_weekly_language_summary(self, user_id):
@@ -483,19 +800,21 @@ class SamboBot:
                 return None
             
             week_number = self._get_week_number()
-            all_rows = self.language_sheet.get_all_values()
-            
+            all_rows = self._cached_get_all_values(self.language_sheet)
+
             totals = {'ch': 0, 'he': 0, 'ta': 0}
-            
-            for row in all_rows[1:]:
-                if len(row) > 5 and row[0] == str(user_id) and row[2] == week_number:
-                    if row[3] == "✓":
-                        totals['ch'] += 1
-                    if row[4] == "✓":
-                        totals['he'] += 1
-                    if row[5] == "✓":
-                        totals['ta'] += 1
-            
+
+            # Only visit this user's rows for this week via the week index,
+            # accumulating through a (key, column) table instead of three
+            # separate branches
+            lang_cols = (('ch', 3), ('he', 4), ('ta', 5))
+            week_index = self._week_index.get(self.language_sheet.title, {})
+            for row_idx in week_index.get((str(user_id), week_number), []):
+                row = all_rows[row_idx - 1]
+                if len(row) > 5:
+                    for key, col in lang_cols:
+                        totals[key] += row[col] == CHECK_MARK
+
             return totals
         except Exception as e:
             logger.error(f"Failed to get weekly language summary: {e}")
@@ -503,43 +822,55 @@ class SamboBot:
 
     # ========== WEEKLY FEEDBACK MECHANISM ==========
     
+    def _scan_activity_weeks(self, user_id, week_numbers):
+        """Aggregate activity stats for the given weeks in one pass over the sheet"""
+        all_rows = self._cached_get_all_values(self.activity_sheet)
+        uid_str = str(user_id)
+
+        stats_by_week = {
+            week: {
+                'week': week,
+                'daily_habits': {1: 0, 2: 0, 3: 0},
+                'weekly_habits': {4: 0, 5: 0},
+                'days_tracked': 0
+            }
+            for week in week_numbers
+        }
+
+        user_rows = self._user_index.get(self.activity_sheet.title, {}).get(uid_str, [])
+        for row_idx in user_rows:
+            row = all_rows[row_idx - 1]
+            if len(row) <= 7:
+                continue
+            stats = stats_by_week.get(row[7])
+            if stats is None:
+                continue
+            stats['days_tracked'] += 1
+            # Daily habits (columns 3-5 = habits 1-3)
+            if row[2] == CHECK_MARK:
+                stats['daily_habits'][1] += 1
+            if row[3] == CHECK_MARK:
+                stats['daily_habits'][2] += 1
+            if row[4] == CHECK_MARK:
+                stats['daily_habits'][3] += 1
+            # Weekly habits (columns 6-7 = habits 4-5)
+            if row[5] == CHECK_MARK:
+                stats['weekly_habits'][4] += 1
+            if row[6] == CHECK_MARK:
+                stats['weekly_habits'][5] += 1
+
+        return stats_by_week
+
     def _get_weekly_stats(self, user_id):
         """Get current week statistics"""
         try:
             if not self.activity_sheet:
                 return None
-            
+
             week_number = self._get_week_number()
-            all_rows = self.activity_sheet.get_all_values()
-            
-            stats = {
-                'week': week_number,
-                'daily_habits': {1: 0, 2: 0, 3: 0},
-                'weekly_habits': {4: 0, 5: 0},
-                'days_tracked': 0
-            }
-            
-            for row in all_rows[1:]:
-                if len(row) > 7 and row[0] == str(user_id) and row[7] == week_number:
-                    stats['days_tracked'] += 1
-                    # Check daily habits (columns 3-5 = habits 1-3)
-                    if row[2] == "✓":
-                        stats['daily_habits'][1] += 1
-                    if row[3] == "✓":
-                        stats['daily_habits'][2] += 1
-                    if row[4] == "✓":
-                        stats['daily_habits'][3] += 1
-                    # Check weekly habits (columns 6-7 = habits 4-5)
-                    if row[5] == "✓":
-                        stats['weekly_habits'][4] += 1
-                    if row[6] == "✓":
-                        stats['weekly_habits'][5] += 1
-            
-            return stats
-        except Exception as e:
-            logger.error(f"Failed to get weekly stats: {e}")
-            import traceback
-            logger.error(traceback.format_exc())
+            return self._scan_activity_weeks(user_id, [week_number])[week_number]
+        except Exception:
+            logger.exception("Failed to get weekly stats")
             return None
 
     def _get_previous_weeks_stats(self, user_id, weeks_back=4):
@@ -547,38 +878,13 @@ class SamboBot:
         try:
             if not self.activity_sheet:
                 return None
-            
-            all_rows = self.activity_sheet.get_all_values()
-            previous_stats = {}
-            
-            for i in range(1, weeks_back + 1):
-                past_date = self._get_moscow_now() - timedelta(weeks=i)
-                week_number = self._get_week_number(past_date)
-                
-                stats = {
-                    'week': week_number,
-                    'daily_habits': {1: 0, 2: 0, 3: 0},
-                    'weekly_habits': {4: 0, 5: 0},
-                    'days_tracked': 0
-                }
-                
-                for row in all_rows[1:]:
-                    if len(row) > 7 and row[0] == str(user_id) and row[7] == week_number:
-                        stats['days_tracked'] += 1
-                        if row[2] == "✓":
-                            stats['daily_habits'][1] += 1
-                        if row[3] == "✓":
-                            stats['daily_habits'][2] += 1
-                        if row[4] == "✓":
-                            stats['daily_habits'][3] += 1
-                        if row[5] == "✓":
-                            stats['weekly_habits'][4] += 1
-                        if row[6] == "✓":
-                            stats['weekly_habits'][5] += 1
-                
-                previous_stats[week_number] = stats
-            
-            return previous_stats
+
+            now = self._get_moscow_now()
+            week_numbers = [
+                self._get_week_number(now - timedelta(weeks=i))
+                for i in range(1, weeks_back + 1)
+            ]
+            return self._scan_activity_weeks(user_id, week_numbers)
         except Exception as e:
             logger.error(f"Failed to get previous weeks stats: {e}")
             return None
@@ -590,7 +896,7 @@ class SamboBot:
                 return None
             
             week_number = self._get_week_number()
-            all_rows = self.consumption_sheet.get_all_values()
+            all_rows = self._cached_get_all_values(self.consumption_sheet)
             
             stats = {
                 'coffee': {'count': 0, 'cost': 0},
@@ -598,77 +904,56 @@ class SamboBot:
                 'flour': {'count': 0, 'cost': 0}
             }
             
-            for row in all_rows[1:]:
-                if len(row) > 8 and row[0] == str(user_id) and row[2] == week_number:
+            # Only visit this user's rows for this week via the week index
+            week_index = self._week_index.get(self.consumption_sheet.title, {})
+            for row_idx in week_index.get((str(user_id), week_number), []):
+                row = all_rows[row_idx - 1]
+                if len(row) > 8:
                     # Coffee
-                    if row[3]:
-                        stats['coffee']['count'] += int(row[3]) if row[3].isdigit() else 0
-                    if row[4]:
-                        stats['coffee']['cost'] += int(row[4]) if row[4].isdigit() else 0
+                    stats['coffee']['count'] += _safe_int(row[3])
+                    stats['coffee']['cost'] += _safe_int(row[4])
                     # Sugary
-                    if row[5]:
-                        stats['sugary']['count'] += int(row[5]) if row[5].isdigit() else 0
-                    if row[6]:
-                        stats['sugary']['cost'] += int(row[6]) if row[6].isdigit() else 0
+                    stats['sugary']['count'] += _safe_int(row[5])
+                    stats['sugary']['cost'] += _safe_int(row[6])
                     # Flour
-                    if row[7]:
-                        stats['flour']['count'] += int(row[7]) if row[7].isdigit() else 0
-                    if row[8]:
-                        stats['flour']['cost'] += int(row[8]) if row[8].isdigit() else 0
+                    stats['flour']['count'] += _safe_int(row[7])
+                    stats['flour']['cost'] += _safe_int(row[8])
             
             return stats
         except Exception as e:
             logger.error(f"Failed to get consumption stats: {e}")
             return None
 
-    def _generate_feedback(self, user_id, current_stats, previous_stats, consumption_stats, language_stats):
+    async def _generate_feedback(self, user_id, current_stats, previous_stats, consumption_stats, language_stats):
         """Generate AI-powered feedback using DeepSeek API"""
         try:
             if not self.deepseek_api_key:
                 logger.warning("DeepSeek API key not set, generating basic feedback")
                 return self._generate_basic_feedback(current_stats, previous_stats, consumption_stats, language_stats)
             
-            # Prepare data for DeepSeek
-            prompt = f"""
-You are a supportive fitness and habit tracking coach. Analyze the following weekly performance data and provide encouraging, constructive feedback.
-
-CURRENT WEEK ({current_stats['week']}) PERFORMANCE:
-- Prayer with first water: {current_stats['daily_habits'][1]} times
-- Qi Gong routine: {current_stats['daily_habits'][2]} times
-- Freestyling on the ball: {current_stats['daily_habits'][3]} times
-- 20 minute run and stretch: {current_stats['weekly_habits'][4]} times
-- Strengthening and stretching: {current_stats['weekly_habits'][5]} times
-- Days tracked: {current_stats['days_tracked']}/6
-
-CONSUMPTION THIS WEEK:
-- Coffee: {consumption_stats['coffee']['count']} doses ({consumption_stats['coffee']['cost']} руб)
-- Sugary food: {consumption_stats['sugary']['count']} doses ({consumption_stats['sugary']['cost']} руб)
-- Flour-based food: {consumption_stats['flour']['count']} doses ({consumption_stats['flour']['cost']} руб)
-
-LANGUAGE LEARNING THIS WEEK:
-- Chinese activation: {language_stats['ch']} sessions
-- Hebrew cards: {language_stats['he']} sessions
-- Tatar cards: {language_stats['ta']} sessions
-
-PREVIOUS WEEKS COMPARISON:
-{self._format_previous_stats(previous_stats)}
-
-Please provide:
-1. A brief summary of this week's performance (2-3 sentences)
-2. Positive highlights (what went well)
-3. Areas for improvement
-4. One specific, actionable goal for next week
-5. Encouragement and motivation
-
-Keep the tone supportive and constructive. Use Russian if appropriate.
-"""
+            # Fill the static template hoisted to module level
+            prompt = _FEEDBACK_PROMPT_TEMPLATE.format(
+                week=current_stats['week'],
+                prayer=current_stats['daily_habits'][1],
+                qigong=current_stats['daily_habits'][2],
+                ball=current_stats['daily_habits'][3],
+                run=current_stats['weekly_habits'][4],
+                strength=current_stats['weekly_habits'][5],
+                days_tracked=current_stats['days_tracked'],
+                coffee_count=consumption_stats['coffee']['count'],
+                coffee_cost=consumption_stats['coffee']['cost'],
+                sugary_count=consumption_stats['sugary']['count'],
+                sugary_cost=consumption_stats['sugary']['cost'],
+                flour_count=consumption_stats['flour']['count'],
+                flour_cost=consumption_stats['flour']['cost'],
+                chinese=language_stats['ch'],
+                hebrew=language_stats['he'],
+                tatar=language_stats['ta'],
+                previous=self._format_previous_stats(previous_stats),
+            )
             
-            response = requests.post(
+            response = await self._http.post(
                 "https://api.deepseek.com/chat/completions",
-                headers={
-                    "Authorization": f"Bearer {self.deepseek_api_key}",
-                    "Content-Type": "application/json"
-                },
                 json={
                     "model": "deepseek-chat",
                     "messages": [
@@ -676,8 +961,7 @@ Keep the tone supportive and constructive. Use Russian if appropriate.
                     ],
                     "temperature": 0.7,
                     "max_tokens": 500
-                },
-                timeout=30
+                }
             )
             
             if response.status_code == 200:
@@ -689,10 +973,8 @@ Keep the tone supportive and constructive. Use Russian if appropriate.
                 logger.error(f"DeepSeek API error: {response.status_code} - {response.text}")
                 return self._generate_basic_feedback(current_stats, previous_stats, consumption_stats, language_stats)
                 
-        except Exception as e:
-            logger.error(f"Failed to generate feedback: {e}")
-            import traceback
-            logger.error(traceback.format_exc())
+        except Exception:
+            logger.exception("Failed to generate feedback")
             return self._generate_basic_feedback(current_stats, previous_stats, consumption_stats, language_stats)
 
     def _format_previous_stats(self, previous_stats):
@@ -734,6 +1016,16 @@ Keep up the great work! 💪
 """
         return feedback
 
+    def _collect_feedback_stats(self, user_id):
+        """Refresh the sheet snapshots once and compute all weekly stats from it"""
+        self._rebuild_indexes()
+        return (
+            self._get_weekly_stats(user_id),
+            self._get_previous_weeks_stats(user_id),
+            self._get_consumption_stats(user_id),
+            self._get_weekly_language_summary(user_id),
+        )
+
     async def send_weekly_feedback(self, context: ContextTypes.DEFAULT_TYPE):
         """Send weekly feedback at 19:20 Saturday"""
         try:
@@ -741,24 +1033,29 @@ Keep up the great work! 💪
                 logger.error("TELEGRAM_USER_ID not set, cannot send feedback")
                 return
             
-            logger.info(f"Sending weekly feedback to user {self.user_id}")
+            uid = int(self.user_id)
+            logger.info(f"Sending weekly feedback to user {uid}")
             
-            # Get statistics
-            current_stats = self._get_weekly_stats(int(self.user_id))
-            previous_stats = self._get_previous_weeks_stats(int(self.user_id))
-            consumption_stats = self._get_consumption_stats(int(self.user_id))
-            language_stats = self._get_weekly_language_summary(int(self.user_id))
+            # Collect all statistics in one executor hop: a single snapshot
+            # refresh serves all four helpers, instead of each one racing the
+            # cache TTL against its own fetch
+            loop = asyncio.get_running_loop()
+            current_stats, previous_stats, consumption_stats, language_stats = (
+                await loop.run_in_executor(
+                    self._executor, self._collect_feedback_stats, uid
+                )
+            )
             
             if not current_stats:
                 await context.bot.send_message(
-                    chat_id=self.user_id,
+                    chat_id=uid,
                     text="📊 No activity recorded this week. Start logging your habits!"
                 )
                 return
             
             # Generate feedback
-            feedback = self._generate_feedback(
-                int(self.user_id),
+            feedback = await self._generate_feedback(
+                uid,
                 current_stats,
                 previous_stats,
                 consumption_stats,
@@ -767,17 +1064,15 @@ Keep up the great work! 💪
             
             # Send feedback
             await context.bot.send_message(
-                chat_id=self.user_id,
+                chat_id=uid,
                 text=feedback,
                 parse_mode="Markdown"
             )
             
             logger.info("Weekly feedback sent successfully")
             
-        except Exception as e:
-            logger.error(f"Failed to send weekly feedback: {e}")
-            import traceback
-            logger.error(traceback.format_exc())
+        except Exception:
+            logger.exception("Failed to send weekly feedback")
 
     # ========== TELEGRAM HANDLERS ==========
     
@@ -807,23 +1102,41 @@ Keep up the great work! 💪
         """Handle incoming messages"""
         user_id = update.effective_user.id
         text = update.message.text.strip().lower()
-        
+
+        # Compute the timestamp once per message so every sub-call agrees on
+        # the date even if the clock rolls over mid-request
+        now = self._get_moscow_now()
+        today_str = _format_date(now)
+        week_number = self._get_week_number(now)
+
+        loop = asyncio.get_running_loop()
+
         # Check for language learning (ch, he, ta)
-        if text in ['ch', 'he', 'ta']:
-            success, message = self._record_language(user_id, text)
+        if text in LANGUAGE_HABITS:
+            success, message = await loop.run_in_executor(
+                self._executor, self._record_language, user_id, text, now, today_str, week_number
+            )
             await update.message.reply_text(message)
             return
-        
+
         # Check for consumption entries (x, y, z)
-        if text and text[0] in ['x', 'y', 'z']:
-            success, message = self._record_consumption(user_id, text)
+        if text and text[0] in CONSUMPTION_HABITS:
+            success, message = await loop.run_in_executor(
+                self._executor, self._record_consumption, user_id, text, now, today_str, week_number
+            )
             await update.message.reply_text(message)
             return
-        
-        # Check for activity habit numbers (1-5)
-        if text.isdigit() and 1 <= int(text) <= 5:
+
+        # Check for activity habit numbers (1-5); the dict covers the common
+        # '1'-'5' spellings, the decimal fallback keeps inputs like '01' or
+        # non-ASCII digits working as they did before the table dispatch
+        habit_id = _HABIT_KEYS.get(text)
+        if habit_id is None and text.isdecimal() and 1 <= int(text) <= 5:
             habit_id = int(text)
-            success, message = self._record_habit(user_id, habit_id)
+        if habit_id is not None:
+            success, message = await loop.run_in_executor(
+                self._executor, self._record_habit, user_id, habit_id, now, today_str, week_number
+            )
             await update.message.reply_text(message)
             return
         
@@ -83,15 +83,13 @@ def main():
         else:
             print("\n✅ Git repository already initialized")
         
-        # Configure git
+        # Configure git (one process for both settings)
         print("\n🔐 Configuring git credentials...")
-        run_command(f'git config user.name "{github_username}"', "Set git username")
-        run_command(f'git config user.email "{github_username}@github.com"', "Set git email")
-        
-        # Check git status
-        print("\n📊 Checking git status...")
-        run_command("git status", "Git status")
-        
+        run_command(
+            f'git config user.name "{github_username}" && git config user.email "{github_username}@github.com"',
+            "Set git username and email"
+        )
+
         # Add all files
         print("\n📦 Adding files...")
         if not run_command("git add .", "Add all files"):
@@ -121,10 +119,7 @@ def main():
             print("❌ Failed to add remote")
             input("Press Enter to exit...")
             sys.exit(1)
-        
-        # Verify remote
-        run_command("git remote -v", "Verify remote")
-        
+
         # Push to GitHub
         print("\n🚀 Pushing to GitHub...")
         print("   This may take a moment...")